@@ -2,6 +2,7 @@ import streamlit as st
 import os
 import sys
 import time
+import concurrent.futures
 
 # [SQLite 호환성 패치]
 try:
@@ -23,17 +24,24 @@ from src.generation.rag import RAGChain
 
 st.set_page_config(page_title="RAG ChatBot", page_icon="🤖", layout="wide")
 
+# 임베딩 모델별 DB 경로
+DB_PATHS = {
+    "bge-m3": "./rfp_database_bge",
+    "kure-v1": "./rfp_database_kure"
+}
+
+def _db_mtime(embedding_model_name):
+    """DB 파일의 수정 시각 (문서 목록 캐시 무효화 기준)"""
+    sqlite_path = os.path.join(DB_PATHS.get(embedding_model_name, ""), "chroma.sqlite3")
+    return os.path.getmtime(sqlite_path) if os.path.exists(sqlite_path) else 0.0
+
 # --- [핵심] DB 로딩 함수 ---
 @st.cache_resource
 def load_vector_store(embedding_model_name):
     """
     선택된 임베딩 모델("bge-m3" or "kure-v1")에 맞는 DB를 로드합니다.
     """
-    db_paths = {
-        "bge-m3": "./rfp_database_bge",
-        "kure-v1": "./rfp_database_kure"
-    }
-    target_path = db_paths.get(embedding_model_name)
+    target_path = DB_PATHS.get(embedding_model_name)
     
     temp_config = config.copy()
     temp_config["vector_db_path"] = target_path
@@ -43,6 +51,33 @@ def load_vector_store(embedding_model_name):
     wrapper.initialize()
     return wrapper
 
+@st.cache_resource
+def load_rag_chain(embedding_model_name, llm_name):
+    """
+    (임베딩, LLM) 조합별 RAG 체인을 전체 세션에서 공유합니다.
+    새 사용자 세션이 들어와도 이미 만들어진 체인을 재사용합니다.
+    """
+    wrapper = load_vector_store(embedding_model_name)
+    return RAGChain(config, wrapper, model_name=llm_name)
+
+@st.cache_resource
+def warm_vector_stores():
+    """
+    앱 기동 시 두 DB(bge-m3 / kure-v1)를 한꺼번에 미리 로드합니다.
+    미리 캐시에 올려두면 대화 중 검색 엔진을 전환해도 대기 시간이 없습니다.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(load_vector_store, ["bge-m3", "kure-v1"]))
+    return True
+
+@st.cache_data(ttl=300)
+def get_document_list(embedding_model_name, db_mtime):
+    """
+    문서 목록을 DB 수정 시각(db_mtime) 기준으로 캐시합니다.
+    매 리런마다 Chroma 메타데이터 전체를 다시 읽지 않습니다.
+    """
+    return load_vector_store(embedding_model_name).get_all_documents()
+
 def reset_selected_docs():
     st.session_state.selected_docs = []  # 문서 선택 초기화
     st.toast("🔄 검색 엔진이 변경되어 문서 선택이 초기화되었습니다.", icon="✨")
@@ -77,8 +112,9 @@ with st.sidebar:
 
 # --- 시스템 로딩 및 하단 사이드바 UI ---
 try:
+    warm_vector_stores()
     vector_store_wrapper = load_vector_store(selected_embedding)
-    all_docs = vector_store_wrapper.get_all_documents()
+    all_docs = get_document_list(selected_embedding, _db_mtime(selected_embedding))
     
     with st.sidebar:
         st.subheader("📂 문서 필터")
@@ -115,11 +151,8 @@ current_settings = f"{selected_embedding}_{selected_llm}"
 
 if "rag_chain" not in st.session_state or st.session_state.get("current_settings") != current_settings:
     with st.spinner(f"⚙️ 엔진 교체 중... (DB: {selected_embedding} / LLM: {selected_llm})"):
-        st.session_state.rag_chain = RAGChain(
-            config, 
-            vector_store_wrapper, 
-            model_name=selected_llm
-        )
+        # 캐시된 체인을 가져옴 (처음 조합일 때만 실제로 생성)
+        st.session_state.rag_chain = load_rag_chain(selected_embedding, selected_llm)
         st.session_state.current_settings = current_settings
     st.toast(f"✅ 시스템 설정 변경 완료!", icon="🔄")
 
@@ -165,25 +198,27 @@ if prompt := st.chat_input("AI RFP 분석기에게 물어보기"):
     with st.chat_message("assistant"):
         with st.spinner("🔍 분석 중..."):
             start_time = time.time()
-            
-            answer, docs = st.session_state.rag_chain.generate_answer(prompt, selected_docs)
-            
-            end_time = time.time()
-            elapsed_time = end_time - start_time
-            
-            st.markdown(answer)
-            st.caption(f"⏱️ 소요 시간: {elapsed_time:.2f}초")
-            
-            sources = []
-            if docs:
-                sources = [{"source": os.path.basename(d.metadata.get('source', 'Unknown')), "content": d.page_content} for d in docs]
-                with st.expander("📚 분석에 사용된 문서"):
-                    for s in sources:
-                        st.markdown(f"- **{s['source']}**: {s['content'][:200]}...")
-
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": answer,
-                "sources": sources,
-                "latency": elapsed_time
-            })
+
+            # 스트리밍: 전체 답변을 기다리지 않고 첫 토큰부터 바로 출력
+            token_stream, docs = st.session_state.rag_chain.stream_answer(prompt, selected_docs)
+
+        answer = st.write_stream(token_stream)
+
+        end_time = time.time()
+        elapsed_time = end_time - start_time
+
+        st.caption(f"⏱️ 소요 시간: {elapsed_time:.2f}초")
+
+        sources = []
+        if docs:
+            sources = [{"source": os.path.basename(d.metadata.get('source', 'Unknown')), "content": d.page_content} for d in docs]
+            with st.expander("📚 분석에 사용된 문서"):
+                for s in sources:
+                    st.markdown(f"- **{s['source']}**: {s['content'][:200]}...")
+
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": answer,
+            "sources": sources,
+            "latency": elapsed_time
+        })
@@ -1,29 +1,49 @@
 import os
 import yaml
+from functools import lru_cache
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# libyaml C 로더가 있으면 사용 (순수 파이썬 SafeLoader보다 수 배 빠름)
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+
+@lru_cache(maxsize=32)
+def _load_yaml_cached(path, mtime):
+    # (경로, 수정시각)이 같으면 다시 파싱하지 않고 캐시된 결과 반환
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=_YamlLoader)
+
+
 class ConfigLoader:
     def __init__(self, config_path: str = "config/local.yaml"):
         self.config = self._load_config(config_path)
+        # "a.b.c" 점 표기 키를 O(1)로 찾을 수 있도록 한 번만 평탄화
+        self._flat = dict(self._flatten(self.config))
+
+    @staticmethod
+    def _flatten(d, prefix=""):
+        if not isinstance(d, dict):
+            return
+        for k, v in d.items():
+            key = f"{prefix}{k}"
+            yield key, v
+            if isinstance(v, dict):
+                yield from ConfigLoader._flatten(v, key + ".")
 
     def _load_config(self, path):
         if not os.path.exists(path):
             # 파일이 없으면 빈 딕셔너리 반환 혹은 에러 처리
             return {}
-        with open(path, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f)
+        return _load_yaml_cached(path, os.path.getmtime(path))
 
     def get(self, key, default=None):
-        keys = key.split(".")
-        value = self.config
-        try:
-            for k in keys:
-                value = value[k]
-            return value
-        except:
-            return default
+        # 점 표기 경로를 매번 따라가지 않고 평탄화된 맵에서 바로 조회
+        return self._flat.get(key, default)
 
 # 전역 객체 생성
 try:
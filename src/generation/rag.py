@@ -1,53 +1,83 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain_ollama import ChatOllama
 
+# 프롬프트 템플릿은 모듈 로드 시 한 번만 파싱합니다.
+# (체인을 새로 만들 때마다 {변수} 스캔을 반복하지 않도록)
+RAG_PROMPT = ChatPromptTemplate.from_template("""
+당신은 RFP(제안요청서) 분석 전문가입니다.
+아래 [Context]에 있는 문서 내용만을 바탕으로 질문에 대해 정확하고 구체적으로 답변하세요.
+문서에 없는 내용은 지어내지 말고 "문서에서 정보를 찾을 수 없습니다"라고 답하세요.
+답변 끝에는 반드시 참고한 문서의 출처나 섹션명을 괄호() 안에 명시해주세요.
+예: (문서의 "사업개요" 부분 참조)
+
+[Context]
+{context}
+
+[Question]
+{question}
+
+[Answer]
+""")
+
+
+@lru_cache(maxsize=8)
+def _get_chat_llm(model_name, base_url, keep_alive):
+    # 같은 (모델, 서버) 조합의 RAGChain끼리 ChatOllama 클라이언트를 공유합니다.
+    # 체인을 새로 만들 때마다 HTTP 커넥션 풀을 다시 여는 비용을 없애고,
+    # keepalive 재사용으로 요청당 핸드셰이크 왕복을 아낍니다.
+    return ChatOllama(
+        model=model_name,
+        base_url=base_url,
+        keep_alive=keep_alive,
+
+        # [청수님 설정] temperature=0.1 (창의성 억제, 사실 기반 답변 유도)
+        temperature=0.1,
+
+        # [청수님 설정] top_p=0.95 (상위 95% 확률 내에서 단어 선택)
+        top_p=0.95,
+
+        # [청수님 설정] repetition_penalty=1.1 -> Ollama에서는 'repeat_penalty'
+        repeat_penalty=1.1,
+
+        # [청수님 설정] max_new_tokens=512 -> Ollama에서는 'num_predict'
+        num_predict=512
+    )
+
+
 class RAGChain:
     def __init__(self, config, vector_store_wrapper, model_name="gemma3:12b"):
         self.config = config
         self.vector_store_wrapper = vector_store_wrapper
         self.model_name = model_name
         
-        # 1. 검색기(Retriever) 설정
-        self.retriever = self.vector_store_wrapper.vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 5}
-        )
+        # 1. 검색 설정
+        # k는 config로 조절 가능 - 리랭커 없이 k만 늘려도 리콜이 올라가고,
+        # 컨텍스트 예산(chunk 중복 제거/글자 수 제한)이 과대 검색분을 걸러줌
+        # (retriever 객체는 따로 두지 않음 - 체인이 세션 간에 공유되므로
+        #  검색 인자는 _retrieve에서 호출별로 전달해야 안전합니다)
+        self.retrieval_k = config.get("retrieval_k", 5)
 
-        # 2. LLM 설정
-        self.llm = ChatOllama(
-            model=self.model_name,
-            
-            # [청수님 설정] temperature=0.1 (창의성 억제, 사실 기반 답변 유도)
-            temperature=0.1,
-            
-            # [청수님 설정] top_p=0.95 (상위 95% 확률 내에서 단어 선택)
-            top_p=0.95,
-            
-            # [청수님 설정] repetition_penalty=1.1 -> Ollama에서는 'repeat_penalty'
-            repeat_penalty=1.1,
-            
-            # [청수님 설정] max_new_tokens=512 -> Ollama에서는 'num_predict'
-            num_predict=512
-        )
+        # 2. LLM 설정 (모듈 레벨 캐시에서 공유 클라이언트를 가져옴)
+        # 서버 주소를 config로 교체 가능 (OLLAMA_NUM_PARALLEL을 올려둔
+        # 서버를 바라보면 동시 요청이 서버 측에서 배칭됩니다)
+        self.llm = _get_chat_llm(
+            self.model_name,
+            config.get("ollama_base_url", "http://localhost:11434"),
 
-        # 3. 프롬프트 템플릿
-        self.prompt = ChatPromptTemplate.from_template("""
-        당신은 RFP(제안요청서) 분석 전문가입니다.
-        아래 [Context]에 있는 문서 내용만을 바탕으로 질문에 대해 정확하고 구체적으로 답변하세요.
-        문서에 없는 내용은 지어내지 말고 "문서에서 정보를 찾을 수 없습니다"라고 답하세요.
-        답변 끝에는 반드시 참고한 문서의 출처나 섹션명을 괄호() 안에 명시해주세요.
-        예: (문서의 "사업개요" 부분 참조)
-
-        [Context]
-        {context}
-
-        [Question]
-        {question}
+            # 요청 사이에 모델을 메모리에서 내리지 않도록 유지 (콜드스타트 방지)
+            config.get("ollama_keep_alive", "10m"),
+        )
 
-        [Answer]
-        """)
+        # 3. 프롬프트 템플릿 (모듈 레벨에서 미리 파싱된 것을 재사용)
+        self.prompt = RAG_PROMPT
 
         # 4. 체인 구성 (수정됨: 리트리버를 체인에서 뺌)
         # 이제 체인은 이미 완성된 'context' 문자열과 'question'만 받아서 처리합니다.
@@ -57,35 +87,178 @@ class RAGChain:
             | StrOutputParser()
         )
 
-    def generate_answer(self, question, selected_docs=[]):
-        """
-        1. 문서 검색 (Retrieve)
-        2. 텍스트 변환 (Format)
-        3. 답변 생성 (Generate)
-        """
-        
-        # 필터링 설정
-        search_kwargs = {"k": 5}
+        # 5. 답변 캐시 (같은 질문 + 같은 문서 선택이면 검색/생성 생략)
+        # 체인이 세션(스레드) 간에 공유되므로 Lock으로 보호합니다.
+        self._answer_cache = OrderedDict()
+        self._answer_cache_lock = threading.Lock()
+        self._cache_max = config.get("answer_cache_size", 256)
+        self._cache_ttl = config.get("answer_cache_ttl", 3600)
+
+    def _cache_get(self, cache_key):
+        """캐시 조회. 적중 시 (답변, 문서) 튜플, 미스 시 None."""
+        with self._answer_cache_lock:
+            cached = self._answer_cache.get(cache_key)
+            if cached and time.monotonic() - cached[0] < self._cache_ttl:
+                self._answer_cache.move_to_end(cache_key)
+                return cached[1], cached[2]
+        return None
+
+    def _cache_put(self, cache_key, answer, retrieved_docs):
+        """캐시 저장. 오래된 항목부터 밀어내는 LRU 방식."""
+        with self._answer_cache_lock:
+            self._answer_cache[cache_key] = (time.monotonic(), answer, retrieved_docs)
+            while len(self._answer_cache) > self._cache_max:
+                self._answer_cache.popitem(last=False)
+
+    def _retrieve(self, question, selected_docs=[]):
+        """문서 검색 + 컨텍스트 문자열 구성 (일반/스트리밍 경로 공용)"""
+
+        # 필터링 설정 - 공유 객체를 고치지 않고 호출 인자로만 전달합니다.
+        # (체인은 st.cache_resource로 모든 세션이 공유하므로, retriever의
+        #  search_kwargs를 바꾸면 동시 사용자끼리 필터가 뒤섞입니다)
+        search_filter = None
         if selected_docs:
             if len(selected_docs) == 1:
-                search_kwargs["filter"] = {"source": selected_docs[0]}
+                search_filter = {"source": selected_docs[0]}
             else:
-                search_kwargs["filter"] = {
+                search_filter = {
                     "$or": [{"source": doc} for doc in selected_docs]
                 }
-        self.retriever.search_kwargs = search_kwargs
-        
+
         # [단계 1] 문서를 먼저 가져옵니다.
-        retrieved_docs = self.retriever.invoke(question)
-        
+        # (래퍼를 거치면 (질의, k, 필터) 단위 결과 캐시의 덕을 봅니다)
+        retrieved_docs = self.vector_store_wrapper.similarity_search(
+            question, k=self.retrieval_k, filter=search_filter
+        )
+
+        # [단계 1.5] 컨텍스트 다이어트: 중복 청크 제거 + 글자 수 예산 적용
+        # LLM 프리필 비용은 컨텍스트 길이에 비례하므로, 같은 내용을 두 번
+        # 넣거나 예산을 초과해서 넣는 것은 순수한 낭비입니다.
+        budget = self.config.get("context_char_budget", 6000)
+        seen = set()
+        kept_docs = []
+        used = 0
+        for doc in retrieved_docs:
+            content = doc.page_content
+            if content in seen:
+                continue
+            if used + len(content) > budget and kept_docs:
+                break
+            seen.add(content)
+            kept_docs.append(doc)
+            used += len(content)
+        retrieved_docs = kept_docs
+
         # [단계 2] 가져온 문서에서 '글자'만 뽑아서 하나의 문자열로 합칩니다. (중요!)
         # 이렇게 하면 AI는 절대 Document 객체(이상한 코드)를 볼 수 없습니다.
-        context_text = "\n\n".join([doc.page_content for doc in retrieved_docs])
-        
+        context_text = "\n\n".join(doc.page_content for doc in retrieved_docs)
+
+        return retrieved_docs, context_text
+
+    def stream_answer(self, question, selected_docs=[]):
+        """
+        generate_answer의 스트리밍 버전.
+        (토큰 제너레이터, 검색된 문서) 튜플을 반환합니다.
+        전체 생성이 끝날 때까지 기다리지 않고 첫 토큰부터 화면에 보여줄 수 있습니다.
+        """
+        # [캐시 확인] 적중하면 검색/생성 없이 답변 전체를 한 번에 내보냄
+        cache_key = (question, tuple(selected_docs or ()))
+        cached = self._cache_get(cache_key)
+        if cached:
+            answer, retrieved_docs = cached
+            return iter([answer]), retrieved_docs
+
+        retrieved_docs, context_text = self._retrieve(question, selected_docs)
+
+        token_stream = self._coalesce_stream(self.chain.stream({
+            "context": context_text,
+            "question": question
+        }))
+
+        # 스트림이 끝까지 소비되면 완성된 답변을 캐시에 넣습니다.
+        return (
+            self._caching_stream(token_stream, cache_key, retrieved_docs),
+            retrieved_docs,
+        )
+
+    def _caching_stream(self, token_stream, cache_key, retrieved_docs):
+        """조각을 흘려보내면서 모아두고, 전부 소비되면 캐시에 저장"""
+        pieces = []
+        for piece in token_stream:
+            pieces.append(piece)
+            yield piece
+        if pieces:
+            self._cache_put(cache_key, "".join(pieces), retrieved_docs)
+
+    def _coalesce_stream(self, token_stream):
+        """
+        토큰 단위 스트림을 ~50ms 윈도우로 묶어서 내보냅니다.
+        토큰 하나마다 UI 업데이트를 밀어넣는 대신 몇 개씩 합쳐 보내면
+        파이썬/전송 계층의 건당 오버헤드가 줄고 체감 지연은 그대로입니다.
+        """
+        window = self.config.get("stream_flush_ms", 50) / 1000.0
+        buf = []
+        last_flush = time.monotonic()
+        for piece in token_stream:
+            if piece:
+                buf.append(piece)
+            now = time.monotonic()
+            if buf and now - last_flush >= window:
+                yield "".join(buf)
+                buf = []
+                last_flush = now
+        if buf:
+            yield "".join(buf)
+
+    def generate_answer(self, question, selected_docs=[]):
+        """
+        1. 문서 검색 (Retrieve)
+        2. 텍스트 변환 (Format)
+        3. 답변 생성 (Generate)
+        """
+        # [캐시 확인] 동일한 (질문, 문서 선택)은 검색 전에 먼저 확인해서
+        # 적중 시 임베딩+벡터 검색까지 통째로 건너뜁니다.
+        cache_key = (question, tuple(selected_docs or ()))
+        cached = self._cache_get(cache_key)
+        if cached:
+            return cached
+
+        retrieved_docs, context_text = self._retrieve(question, selected_docs)
+
         # [단계 3] 깨끗한 텍스트를 체인에 넣어줍니다.
         answer = self.chain.invoke({
             "context": context_text, 
             "question": question
         })
-        
-        return answer, retrieved_docs
\ No newline at end of file
+
+        self._cache_put(cache_key, answer, retrieved_docs)
+
+        return answer, retrieved_docs
+
+    async def agenerate_answer(self, question, selected_docs=[]):
+        """
+        generate_answer의 비동기 버전.
+        여러 질문을 asyncio.gather로 동시에 던지면 LLM 호출이 이벤트 루프에서
+        겹쳐 실행되어, 질문 수만큼 순차 대기하지 않아도 됩니다.
+        (OLLAMA_NUM_PARALLEL을 올려둔 서버에서 효과가 큽니다.)
+        """
+        cache_key = (question, tuple(selected_docs or ()))
+        cached = self._cache_get(cache_key)
+        if cached:
+            return cached
+
+        # 검색(임베딩 HTTP 왕복 + ANN 탐색)은 동기 코드라서 이벤트 루프를
+        # 막지 않도록 스레드로 내립니다. gather로 모인 질문들의 검색도
+        # 이렇게 해야 실제로 겹쳐 실행됩니다.
+        retrieved_docs, context_text = await asyncio.to_thread(
+            self._retrieve, question, selected_docs
+        )
+
+        answer = await self.chain.ainvoke({
+            "context": context_text,
+            "question": question
+        })
+
+        self._cache_put(cache_key, answer, retrieved_docs)
+
+        return answer, retrieved_docs
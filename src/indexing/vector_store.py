@@ -1,6 +1,59 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
 from langchain_chroma import Chroma
 from langchain_ollama import OllamaEmbeddings
 
+
+class _CachedEmbeddings:
+    """
+    embed_query 결과를 TTL+LRU로 캐시하는 얇은 래퍼.
+
+    같은 질문을 다시 임베딩하면 Ollama 왕복(수십 ms) 대신 저장된 벡터를
+    바로 반환합니다. embed_documents(인제스트용)는 그대로 통과시킵니다.
+    """
+
+    def __init__(self, inner, model_name, max_size=512, ttl=3600):
+        self._inner = inner
+        self._model = model_name
+        self._max_size = max_size
+        self._ttl = ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        return self._inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = hashlib.sha256(f"{self._model}|{text}".encode("utf-8")).hexdigest()
+
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit and time.monotonic() - hit[0] < self._ttl:
+                self._cache.move_to_end(key)
+                return hit[1]
+
+        vector = self._inner.embed_query(text)
+
+        with self._lock:
+            self._cache[key] = (time.monotonic(), vector)
+            while len(self._cache) > self._max_size:
+                self._cache.popitem(last=False)
+
+        return vector
+
+
+@lru_cache(maxsize=4)
+def _get_embeddings(model_name):
+    # 같은 모델을 쓰는 Wrapper끼리 임베딩 클라이언트(HTTP 커넥션 풀)와
+    # 질의 임베딩 캐시를 공유
+    return _CachedEmbeddings(OllamaEmbeddings(model=model_name), model_name)
+
+
 class VectorStoreWrapper:
     def __init__(self, config):
         self.config = config
@@ -9,22 +62,81 @@ class VectorStoreWrapper:
         self.persist_directory = config.get("vector_db_path", "./rfp_database_bge")
         self.embedding_model_name = config.get("embedding_model", "bge-m3")
 
+        # 검색 결과 캐시: (정규화된 질의, k, 필터) -> 문서 리스트
+        # 같은 질문이 반복되면 임베딩+HNSW 탐색 없이 바로 반환
+        self._search_cache = OrderedDict()
+        self._search_cache_lock = threading.Lock()
+        self._search_cache_max = config.get("search_cache_size", 256)
+        self._search_cache_ttl = config.get("search_cache_ttl", 300)
+
     def initialize(self):
         print(f"📂 DB 로딩 시작: {self.persist_directory} (Model: {self.embedding_model_name})")
         
-        # 동적으로 모델명 할당
-        self.embedding = OllamaEmbeddings(model=self.embedding_model_name)
+        # 동적으로 모델명 할당 (모델별로 캐시된 클라이언트 재사용)
+        self.embedding = _get_embeddings(self.embedding_model_name)
         
+        # HNSW 파라미터 (scripts/main.py의 빌드 설정과 동일한 기본값)
+        # chromadb는 이미 있는 컬렉션에는 이 metadata를 무시하거나, 버전에
+        # 따라 기존 설정(예: L2로 만든 DB)과 충돌하면 에러를 내므로,
+        # DB를 여기서 '새로 만드는' 경우에만 전달합니다.
+        chroma_kwargs = {}
+        if not os.path.exists(self.persist_directory):
+            chroma_kwargs["collection_metadata"] = self.config.get("vector_db_hnsw", {
+                "hnsw:space": "cosine",
+                "hnsw:construction_ef": 200,
+                "hnsw:search_ef": 64,
+                "hnsw:M": 32,
+            })
+
         self.vector_store = Chroma(
             persist_directory=self.persist_directory,
-            embedding_function=self.embedding
+            embedding_function=self.embedding,
+            **chroma_kwargs
         )
+
+        # 워밍업: Ollama가 임베딩 모델을 미리 메모리에 올리게 해서
+        # 첫 질문에서 모델 로딩 지연(수 초)이 발생하지 않도록 함
+        try:
+            self.embedding.embed_query("워밍업")
+        except Exception:
+            # 서버가 아직 안 떠 있어도 로딩 자체는 계속 진행
+            pass
+
         print("✅ DB 로딩 완료!")
 
+    def similarity_search(self, query, k=5, filter=None):
+        """단일 질의 유사도 검색 (결과 캐시 -> 임베딩 캐시 -> Chroma 순)"""
+        if not self.vector_store:
+            return []
+
+        # 필터도 키에 포함 - 필터가 다른데 같은 결과를 돌려주면 안 됨
+        key = (" ".join(query.split()), k, repr(filter))
+        with self._search_cache_lock:
+            hit = self._search_cache.get(key)
+            if hit and time.monotonic() - hit[0] < self._search_cache_ttl:
+                self._search_cache.move_to_end(key)
+                return hit[1]
+
+        results = self.vector_store.similarity_search(query, k=k, filter=filter)
+
+        with self._search_cache_lock:
+            self._search_cache[key] = (time.monotonic(), results)
+            while len(self._search_cache) > self._search_cache_max:
+                self._search_cache.popitem(last=False)
+
+        return results
+
     def get_all_documents(self):
         if not self.vector_store:
             return []
         # 메타데이터에서 source만 추출해서 중복 제거 후 반환
-        data = self.vector_store.get()
-        sources = set([meta.get('source').split('/')[-1] for meta in data['metadatas']])
+        # (dict.fromkeys: 한 번의 순회로 중복 제거 + 등장 순서 유지)
+        # include로 메타데이터만 가져옴 - 임베딩/본문까지 다 읽으면
+        # 청크 수 x 벡터 크기만큼 메모리를 낭비하게 됨
+        data = self.vector_store.get(include=["metadatas"])
+        sources = dict.fromkeys(
+            os.path.basename(src)
+            for meta in data['metadatas']
+            if (src := meta.get('source'))
+        )
         return list(sources)